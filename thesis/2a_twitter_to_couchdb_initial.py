@@ -26,6 +26,7 @@ from TwitterSearch.TwitterSearchException import TwitterSearchException
 import couchdb
 import json
 import sys
+import view_indexer
 
 
 BRAND = sys.argv[1]
@@ -112,6 +113,9 @@ while True:
             database.save(tweet)
 
     print('Imported {} of {} tweets.'.format(num_imported, num_processed))
+    # Let CouchDB index the new tweets in the background, so that the views
+    # are ready when we query them later.
+    view_indexer.trigger_index_build(database)
 
     if num_processed == 0:
         print('It seems that we have imported all tweets. Aborting.')
@@ -21,11 +21,18 @@ position.
 In order to detect whether a tweet is older or newer than another tweet, we
 rely on that fact that the tweet ID's are strictly monotonous growing.
 
+The session state is stored in a checkpoint journal (see journal.py): the
+imported tweets are saved to CouchDB in batches and the progress of each batch
+is committed to the journal after the batch was saved. The journal is
+compacted with an atomic rename, so a crash can never corrupt the session
+state.
+
 The script is very similar to 01_twitter_to_couchdb_initial.py.
 Main differences:
 - session handling
 - max_id query parameter
 - abort condition
+- batched saving
 
 Usage example:
 thesis/2b_twitter_to_couchdb_update.py facebook
@@ -33,6 +40,7 @@ thesis/2b_twitter_to_couchdb_update.py facebook
 The brand (facebook) can be replaced with any brand name.
 """
 
+from journal import CheckpointJournal
 from path import Path
 from time import sleep
 from tqdm import tqdm
@@ -42,6 +50,7 @@ from TwitterSearch.TwitterSearchException import TwitterSearchException
 import couchdb
 import json
 import sys
+import view_indexer
 
 
 BRAND = sys.argv[1]
@@ -49,6 +58,9 @@ COUCH_DATABASE_NAME = 'mt-twitter-' + BRAND
 TWITTER_SEARCH_KEYWORDS = [BRAND]
 TWITTER_CREDENTIALS = json.loads(Path(__file__).joinpath(
     '..', '..', 'twitter.cfg.json').abspath().bytes())
+# Amount of tweets saved to CouchDB with one bulk request; the session
+# checkpoint is committed once per batch.
+TWEETS_PER_BATCH = 100
 
 
 # Establish connection to CouchDB and select the database to write into.
@@ -59,32 +71,54 @@ database = couchdb.Server()[COUCH_DATABASE_NAME]
 # Setup a twitter connection and configure its credentials:
 twitter_connection = TwitterSearch(**TWITTER_CREDENTIALS)
 
-# The SESSION_STATE_FILE contains the path to a file where infos about the
-# import session are stored.
-# If the SESSION_STATE_FILE exists, we are currently in the middle of an import
-# session and the file describes the gap between the previously already
+# The SESSION_JOURNAL stores infos about the import session in the files
+# "session_state_<brand>.json" (snapshot) and "session_state_<brand>.journal"
+# (progress since the snapshot).
+# If there is a session state, we are currently in the middle of an import
+# session and the state describes the gap between the previously already
 # existing tweets and the newer tweets we are currently importing.
-# The file contains a JSON string with these infos:
+# The state contains these infos:
 # - "previously_newest_tweet": the ID of the tweet which was the newest before
 #   we started
 #   the current import session
 # - "session_oldest_tweet": the ID of the oldest tweet imported in this session,
 #   which is
 #   normally the last imported tweet.
-SESSION_STATE_FILE = Path(__file__).joinpath('..', '..', 'session_state_' +
-                                             BRAND + '.json').abspath()
+SESSION_JOURNAL = CheckpointJournal(Path(__file__).joinpath(
+    '..', '..', 'session_state_' + BRAND).abspath())
 
-if SESSION_STATE_FILE.exists():
-    # There is already an active session; load the session state from the file
-    # and continue where we stopped.
-    SESSION_STATE = json.loads(SESSION_STATE_FILE.bytes())
+if SESSION_JOURNAL.state and 'previously_newest_tweet' in SESSION_JOURNAL.state:
+    # There is already an active session; the journal has recovered the last
+    # consistent session state and we continue where we stopped.
+    SESSION_STATE = SESSION_JOURNAL.state
 else:
     # We are stating a new import session, so lets start by writing an session
-    # state file with the currently newest tweet ID.
+    # state with the currently newest tweet ID.
+    # When a session state written by an older version of this script was
+    # corrupted, we also end up here; the lost gap can be filled with
+    # 2d_twitter_gap_backfill.py.
     document_ids = tuple(filter(lambda id_: not id_.startswith('_'), database))
-    SESSION_STATE = {'previously_newest_tweet': max(document_ids),
-                     'session_oldest_tweet': None}
-    SESSION_STATE_FILE.write_text(json.dumps(SESSION_STATE))
+    SESSION_JOURNAL.start({'previously_newest_tweet': max(document_ids),
+                           'session_oldest_tweet': None})
+    SESSION_STATE = SESSION_JOURNAL.state
+
+
+def flush(tweets):
+    """Save a batch of tweets with a single bulk request and commit the
+    session progress afterwards, so that the checkpoint is never ahead of
+    the database.
+    """
+    if not tweets:
+        return
+    for success, doc_id, error in database.update(tweets):
+        # A conflict means that the tweet already exists, which is fine.
+        if not success and not isinstance(error, couchdb.ResourceConflict):
+            raise error
+    SESSION_JOURNAL.commit()
+    del tweets[:]
+    # Let CouchDB index the new tweets in the background, so that the views
+    # are ready when we query them later.
+    view_indexer.trigger_index_build(database)
 
 
 # The twitter client may stop iterating the tweets at some point.
@@ -135,9 +169,9 @@ while True:
         # There are no new tweets with this query, so we can terminate the
         # import.
         print('Import finished, terminating session.')
-        # We are removing the session file in order to terminate the session,
+        # We are removing the session files in order to terminate the session,
         # so that the next run begins a fresh session.
-        SESSION_STATE_FILE.remove()
+        SESSION_JOURNAL.remove()
         # We exit the program with an exit code of 0, indicating that everything
         # was successful.
         sys.exit(0)
@@ -145,6 +179,8 @@ while True:
     # Track some statistics for displaying the progress:
     num_processed = 0
     num_imported = 0
+    # Tweets which are not yet saved to the database:
+    batch = []
 
     # Now we import the tweets into our CouchDB.
     # We use tqdm for displaying status information about how many objects were
@@ -158,10 +194,11 @@ while True:
         # The IDs are actually numbers and should be compared as numbers (int),
         # not as text.
         if int(tweet['id']) < int(SESSION_STATE['previously_newest_tweet']):
+            flush(batch)
             print('Import finished, terminating session.')
-            # We are removing the session file in order to terminate the
+            # We are removing the session files in order to terminate the
             # session, so that the next run begins a fresh session.
-            SESSION_STATE_FILE.remove()
+            SESSION_JOURNAL.remove()
             # We exit the program with an exit code of 0, indicating that
             # everything was successful.
             sys.exit(0)
@@ -171,13 +208,16 @@ while True:
         tweet['_id'] = str(tweet['id'])
         if tweet['_id'] not in database:
             # The tweet does not yet exist in our database, therefore we are
-            # saving it.
+            # saving it with the next batch.
             num_imported += 1
-            database.save(tweet)
-            # We update the session data and store it to the session file so
-            # that we can continue from this point when we are recovering the
-            # session (restarting the import).
-            SESSION_STATE['session_oldest_tweet'] = tweet['_id']
-            SESSION_STATE_FILE.write_text(json.dumps(SESSION_STATE))
-
+            batch.append(tweet)
+            # We record the progress in the session journal so that we can
+            # continue from this point when we are recovering the session
+            # (restarting the import). The record is persisted together with
+            # the batch.
+            SESSION_JOURNAL.append({'session_oldest_tweet': tweet['_id']})
+            if len(batch) >= TWEETS_PER_BATCH:
+                flush(batch)
+
+    flush(batch)
     print('Imported {} of {} tweets.'.format(num_imported, num_processed))
@@ -14,6 +14,7 @@ from tqdm import tqdm
 import couchdb
 import dateutil.parser
 import requests
+import rollup
 import sys
 
 
@@ -53,3 +54,6 @@ for time, item in tqdm(data['Time Series (60min)'].items()):
            'raw': item}
     # Store it in the database
     database.save(doc)
+
+# Add the new stock prices to the pre-aggregated data per minute, hour and day.
+rollup.Pyramid(BRAND).update_stock()
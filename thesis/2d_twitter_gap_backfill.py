@@ -0,0 +1,191 @@
+"""
+Backfill gaps in the imported tweets of a brand.
+
+The goal of this script is to find all holes in our tweet imports (e.g. because
+the update cron job did not run for a while) and to import the missing tweets.
+In contrast to 2b_twitter_to_couchdb_update.py, which can only close the single
+gap between the previously newest tweet and now, this script can fill any
+amount of gaps and fills several of them concurrently.
+
+The covered tweet ID ranges are tracked in a persistent gap index (see
+gap_index.py). The index is refreshed with the tweets in our database at every
+start, so gaps are detected automatically. Each gap is then imported with a
+twitter query limited by since_id and max_id, working backwards in time from
+the newer end of the gap. The oldest imported tweet of each gap is stored as
+checkpoint in the index, so that the script can crash and continues where it
+stopped when it is restarted.
+
+Ranges with incomplete data (e.g. because of a bad search query) can be
+reopened, so that they are imported again. START and END are in UTC unless
+they contain a timezone; a date without time as END includes the whole day.
+Both must lie within the twitter search window (see below), e.g. for a bad
+query during the last two days:
+thesis/2d_twitter_gap_backfill.py facebook --reopen 2018-05-14 2018-05-15
+
+Keep in mind that the standard search endpoint of the twitter API only
+contains approximately the last 7 days of history. Gaps which reach back
+further are only filled (and marked as covered) within the search window;
+older gaps are counted but cannot be filled. Reopened ranges which have left
+the search window are dropped.
+
+Usage example:
+thesis/2d_twitter_gap_backfill.py facebook
+
+The brand (facebook) can be replaced with any brand name.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from gap_index import GapIndex
+from gap_index import datetime_from_tweet_id
+from gap_index import tweet_id_from_datetime
+from path import Path
+from time import sleep
+from tqdm import tqdm
+from TwitterSearch import TwitterSearch
+from TwitterSearch import TwitterSearchOrder
+from TwitterSearch.TwitterSearchException import TwitterSearchException
+import argparse
+import couchdb
+import json
+import re
+import utils
+import view_indexer
+
+
+parser = argparse.ArgumentParser(description='Backfill gaps in the tweets.')
+parser.add_argument('brand')
+parser.add_argument('--workers', type=int, default=3,
+                    help='Amount of gaps to fill concurrently.')
+parser.add_argument('--min-gap-minutes', type=int, default=60,
+                    help='Minutes without tweets which are considered a gap.')
+parser.add_argument('--reopen', nargs=2, action='append', default=[],
+                    metavar=('START', 'END'),
+                    help='Import the time range START to END (UTC) again.')
+ARGS = parser.parse_args()
+
+BRAND = ARGS.brand
+COUCH_DATABASE_NAME = 'mt-twitter-' + BRAND
+TWITTER_SEARCH_KEYWORDS = [BRAND]
+TWITTER_CREDENTIALS = json.loads(Path(__file__).joinpath(
+    '..', '..', 'twitter.cfg.json').abspath().bytes())
+# Approximately how far back the standard search endpoint reaches.
+TWITTER_SEARCH_WINDOW = timedelta(days=7)
+# Store a checkpoint after this amount of processed tweets, which is the
+# amount of tweets twitter returns per page.
+TWEETS_PER_CHECKPOINT = 100
+
+
+# Establish connection to CouchDB and select the database to write into.
+# The database must already exist; create it manually in the CouchDB control
+# panel first.
+database = couchdb.Server()[COUCH_DATABASE_NAME]
+
+# Twitter does not return tweets older than this ID, so we must not mark
+# anything older as covered.
+search_window_start_id = tweet_id_from_datetime(
+    datetime.utcnow() - TWITTER_SEARCH_WINDOW)
+
+gap_index = GapIndex.for_brand(BRAND)
+gap_index.expire_reopened(search_window_start_id)
+for start, end in ARGS.reopen:
+    start_id = tweet_id_from_datetime(utils.utc_from_string(start))
+    end_id = tweet_id_from_datetime(utils.utc_from_string(end))
+    if re.match(r'^\d{4}-\d{2}-\d{2}$', end.strip()):
+        # A date without time includes the whole day.
+        end_id = tweet_id_from_datetime(
+            utils.utc_from_string(end) + timedelta(days=1)) - 1
+    if end_id <= search_window_start_id:
+        parser.error('Cannot reopen {} to {}: the range is older than the '
+                     'twitter search window.'.format(start, end))
+    gap_index.reopen(max(start_id, search_window_start_id), end_id)
+
+# Refresh the index with the tweets currently in the database so that we
+# detect new gaps.
+document_ids = tuple(filter(lambda id_: not id_.startswith('_'), database))
+gap_index.refresh(document_ids, timedelta(minutes=ARGS.min_gap_minutes))
+
+
+def backfill(gap, position):
+    """Import all tweets of a gap within the search window, newest first,
+    and mark this part of the gap as covered when there are no more tweets.
+    Each worker thread uses its own connections to twitter and CouchDB.
+    """
+    since_id = max(gap[0], search_window_start_id - 1)
+    max_id = gap[1]
+    twitter_connection = TwitterSearch(**TWITTER_CREDENTIALS)
+    database = couchdb.Server()[COUCH_DATABASE_NAME]
+    num_imported = 0
+
+    while True:
+        twitter_query = TwitterSearchOrder()
+        twitter_query.set_keywords(TWITTER_SEARCH_KEYWORDS)
+        twitter_query.set_language('en')
+        twitter_query.set_include_entities(False)
+        # since_id is exclusive and max_id inclusive; the tweets with exactly
+        # those IDs are already imported.
+        twitter_query.set_since_id(since_id)
+        twitter_query.set_max_id((gap_index.checkpoint(gap) or max_id) - 1)
+
+        oldest_id = None
+        try:
+            twitter_result_stream = twitter_connection.search_tweets_iterable(
+                twitter_query)
+            if twitter_result_stream.get_amount_of_tweets() == 0:
+                # There are no more tweets in the gap, so it is closed as far
+                # as we have walked it.
+                gap_index.close_gap(gap, since_id)
+                return num_imported
+
+            description = 'Gap {:%Y-%m-%d %H:%M}'.format(
+                datetime_from_tweet_id(max_id))
+            for num_processed, tweet in enumerate(
+                    tqdm(twitter_result_stream, description,
+                         position=position), 1):
+                tweet['_id'] = str(tweet['id'])
+                if tweet['_id'] not in database:
+                    num_imported += 1
+                    database.save(tweet)
+                oldest_id = tweet['id']
+                if num_processed % TWEETS_PER_CHECKPOINT == 0:
+                    gap_index.set_checkpoint(gap, oldest_id)
+                    # Let CouchDB index the new tweets in the background.
+                    view_indexer.trigger_index_build(database)
+
+        except TwitterSearchException as exc:
+            if exc.code != 429:
+                raise
+            # Twitter has responded with a "429 Too Many Requests" error.
+            # The workers share the rate limit, so we simply wait and continue
+            # at the last checkpoint.
+            sleep(100)
+
+        if oldest_id is not None:
+            gap_index.set_checkpoint(gap, oldest_id)
+            view_indexer.trigger_index_build(database)
+
+
+gaps = []
+num_unreachable = 0
+for gap in gap_index.gaps():
+    if gap[1] <= search_window_start_id:
+        num_unreachable += 1
+        continue
+    print('Gap from {:%Y-%m-%d %H:%M} to {:%Y-%m-%d %H:%M}'.format(
+        *map(datetime_from_tweet_id, gap)))
+    gaps.append(gap)
+
+if num_unreachable:
+    print('Skipping {} gaps older than the twitter search window.'.format(
+        num_unreachable))
+
+if not gaps:
+    print('There are no gaps to fill.')
+else:
+    with ThreadPoolExecutor(max_workers=ARGS.workers) as executor:
+        results = executor.map(backfill, gaps,
+                               [index % ARGS.workers
+                                for index in range(len(gaps))])
+        num_imported = sum(results)
+    print('Imported {} tweets into {} gaps.'.format(num_imported, len(gaps)))
@@ -8,6 +8,9 @@ The sentiment is extracted with Vader from NLTK (natural language toolkit for
 Python) using the SentimentIntensityAnalyzer, which is a pre-trainend algorithm
 for sentiment analysis.
 The sentiment is stored as "vader_sentiment" attribute for each tweet document.
+At the end, the views are indexed and the new sentiments are added to the
+rollup pyramid (see rollup.py), so that the plotting scripts do not have to
+wait for it.
 
 Usage example:
 thesis/3a_twitter_sentiment_analysis_vader.py facebook
@@ -17,7 +20,9 @@ thesis/3a_twitter_sentiment_analysis_vader.py facebook
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from tqdm import tqdm
 import couchdb
+import rollup
 import sys
+import view_indexer
 
 
 BRAND = sys.argv[1]
@@ -26,7 +31,8 @@ COUCH_DATABASE_NAME = 'mt-twitter-' + BRAND
 # Establish connection to CouchDB and select the database to write into.
 # The database must already exist; create it manually in the CouchDB control
 # panel first.
-database = couchdb.Server()[COUCH_DATABASE_NAME]
+couchdb_connection = couchdb.Server()
+database = couchdb_connection[COUCH_DATABASE_NAME]
 
 # Instantiate a sentiment intensity analyzer.
 sentiment_analyzer = SentimentIntensityAnalyzer()
@@ -58,3 +64,13 @@ for i in tqdm(range(int(num_of_tweets / tweets_per_batch) + 1)):
             tweet['text'])['compound']
         # and save the tweet back to the database.
         database.save(tweet)
+
+    # Let CouchDB index the scored tweets in the background while we are
+    # processing the next batch.
+    view_indexer.trigger_index_build(database)
+
+# Wait until the views are up to date and display the indexing progress.
+view_indexer.warm_up(couchdb_connection, database)
+
+# Add the new sentiments to the pre-aggregated data per minute, hour and day.
+rollup.Pyramid(BRAND).update_sentiment()
@@ -1,64 +1,43 @@
 """
-Plot vader sentiment and stock price per hour.
+Plot vader sentiment and stock price per hour (or minute or day).
 
 Usage example:
 thesis/4a_plot_vader_sentiment_and_stock.py facebook
+
+The data is aggregated per hour by default; use --resolution to choose
+"minute", "hour" or "day". The output files of other resolutions than "hour"
+contain the resolution in their name, e.g. "plot/facebook_day_...".
+
+The data is read from the rollup pyramid (see rollup.py), which is updated
+with the new tweets and stock bars first. With --stale the stored rollups are
+used without updating them; the results may then be slightly outdated.
 """
 
-from collections import defaultdict
 from plotly import graph_objs as go
 from plotly.offline import plot
-from tqdm import tqdm
-import couchdb
-import numpy as np
-import sys
+import argparse
+import loader
 import utils
 
 
-BRAND = sys.argv[1]
-TWITTER_COUCH_DATABASE_NAME = 'mt-twitter-' + BRAND
-STOCK_COUCH_DATABASE_NAME = 'mt-stock-' + BRAND
-
-
-# Establish connection to CouchDB and select the databases to write into.
-# The database must already exist; create it manually in the CouchDB control
-# panel first.
-couchdb_connection = couchdb.Server()
-twitter_database = couchdb_connection[TWITTER_COUCH_DATABASE_NAME]
-stock_database = couchdb_connection[STOCK_COUCH_DATABASE_NAME]
-
-
-# Load the tweets with the sentiments from the database and group them per
-# timespan:
-tweet_sentiments_per_timespan = defaultdict(list)
-tweets = twitter_database.view('vader_sentiment/with')
-for item in tqdm(tweets, 'Loading tweets..'):
-    tweet_sentiments_per_timespan[utils.hour_from_string(item.key)].append(
-        item.value)
+parser = argparse.ArgumentParser()
+parser.add_argument('brand')
+parser.add_argument('--resolution', choices=utils.RESOLUTIONS,
+                    default='hour', help='Time span of the aggregated data.')
+parser.add_argument('--stale', action='store_true',
+                    help='Use the stored rollups without updating them.')
+ARGS = parser.parse_args()
 
+BRAND = ARGS.brand
+RESOLUTION = ARGS.resolution
+OUTPUT_NAME = BRAND if RESOLUTION == 'hour' else BRAND + '_' + RESOLUTION
 
-# Load the stock data.
-mango_query = {'selector': {'_id': {'$gt': None}},
-               'limit': 10**10}
-stock_per_timespan = defaultdict(list)
-for item in tqdm(stock_database.find(mango_query), 'Loading stock data..'):
-    stock_per_timespan[utils.hour_from_string(item['time'])] = float(
-        item['price'])
 
+# Load the sentiment and stock data per timespan from the rollups.
+sentiment, stock = loader.load(BRAND, RESOLUTION, stale=ARGS.stale)
 
 # Build sorted axis for plotting.
-plot_data = {
-    'time': [],
-    'tweets': [],
-    'sentiment': [],
-    'stock': []}
-for time, sentiment in tqdm(sorted(tweet_sentiments_per_timespan.items()),
-                            'Prepare data...'):
-    plot_data['time'].append(time)
-    plot_data['tweets'].append(len(sentiment))
-    plot_data['sentiment'].append(np.mean(sentiment))
-    previous_stock = plot_data['stock'] and plot_data['stock'][-1] or None
-    plot_data['stock'].append(stock_per_timespan.get(time, previous_stock))
+plot_data = loader.plot_data(sentiment, stock)
 
 
 color1 = '#96C3DC'
@@ -110,4 +89,4 @@ plot(
                     'titlefont': dict(color=color3),
                     'tickfont': dict(color=color3)},
         )),
-    filename='plot/{}_sentiment.html'.format(BRAND))
+    filename='plot/{}_sentiment.html'.format(OUTPUT_NAME))
@@ -0,0 +1,71 @@
+"""
+Running statistics per time bucket (e.g. per hour).
+
+Instead of keeping every single value in memory, we only keep the count, the
+sum and the sum of squares of the values per bucket in a numpy array, which is
+grown when new buckets are added. The memory usage therefore depends on the
+amount of buckets, not on the amount of values.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class BucketStats(object):
+    """Array-backed running count, sum and sum of squares per bucket.
+    """
+
+    COLUMNS = ('count', 'total', 'total_sq')
+
+    def __init__(self, buckets=(), values=None, capacity=1024):
+        """Create the statistics, optionally from stored buckets (in the
+        order of their slots) and their values.
+        """
+        self.slots = {bucket: slot for slot, bucket in enumerate(buckets)}
+        self.values = self._empty(max(capacity, len(self.slots)))
+        if values is not None:
+            self.values[:len(values)] = values
+
+    def _empty(self, size):
+        return np.zeros((size, len(self.COLUMNS)))
+
+    def _slot(self, bucket):
+        slot = self.slots.get(bucket)
+        if slot is None:
+            slot = self.slots[bucket] = len(self.slots)
+            if slot == len(self.values):
+                grown = self._empty(len(self.values) * 2)
+                grown[:slot] = self.values
+                self.values = grown
+        return slot
+
+    def add(self, bucket, value):
+        row = self.values[self._slot(bucket)]
+        row[0] += 1
+        row[1] += value
+        row[2] += value * value
+
+    def buckets(self):
+        """Return the buckets in the order of their slots.
+        """
+        return sorted(self.slots, key=self.slots.get)
+
+    def _sorted_values(self):
+        buckets = sorted(self.slots)
+        return (pd.DatetimeIndex(buckets),
+                self.values[[self.slots[bucket] for bucket in buckets]])
+
+    def to_frame(self):
+        """Return a data frame indexed by bucket with the columns "count",
+        "mean" and "std" for all buckets with values.
+        """
+        index, values = self._sorted_values()
+        has_values = values[:, 0] > 0
+        count = values[has_values, 0]
+        mean = values[has_values, 1] / count
+        variance = np.maximum(values[has_values, 2] / count - mean ** 2, 0)
+        return pd.DataFrame({'count': count,
+                             'mean': mean,
+                             'std': np.sqrt(variance)},
+                            index=index[has_values],
+                            columns=['count', 'mean', 'std'])
@@ -0,0 +1,192 @@
+"""
+Persistent index of the tweet ID ranges we have covered per brand.
+
+Twitter tweet IDs are "snowflake" IDs: the upper bits contain the
+milliseconds since the twitter epoch, so the ID alone tells us when a tweet
+was created. This allows us to detect holes in our imports without loading a
+single tweet document: when two consecutive tweet IDs in our database are too
+far apart in time, we have a gap.
+
+The index is stored as JSON file ("gap_index_<brand>.json") next to the
+session state files and contains:
+- "covered": a sorted list of [low, high] tweet ID ranges (both inclusive)
+  which are known to be completely imported, e.g. because a backfill has
+  successfully walked through the range.
+- "reopened": a list of [low, high] tweet ID ranges which must be imported
+  again even though there are tweets in the database, e.g. because a bad
+  search query has produced incomplete data in that range.
+- "checkpoints": per gap ("<low>-<high>") the oldest tweet ID imported so far,
+  so that an aborted backfill continues where it stopped.
+"""
+
+from datetime import datetime
+from journal import atomic_write_json
+from path import Path
+from threading import RLock
+import json
+
+
+# Milliseconds between the unix epoch and the twitter snowflake epoch
+# (2010-11-04 01:42:54.657 UTC).
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def datetime_from_tweet_id(tweet_id):
+    """Return the (naive, UTC) creation time encoded in a snowflake tweet ID.
+    """
+    milliseconds = (int(tweet_id) >> 22) + TWITTER_EPOCH_MS
+    return datetime.utcfromtimestamp(milliseconds / 1000.0)
+
+
+def tweet_id_from_datetime(date):
+    """Return the smallest snowflake tweet ID which could have been created
+    at the given (naive, UTC) datetime.
+    """
+    milliseconds = int((date - datetime(1970, 1, 1)).total_seconds() * 1000)
+    return max(milliseconds - TWITTER_EPOCH_MS, 0) << 22
+
+
+def ranges_from_ids(tweet_ids, max_gap):
+    """Group tweet IDs into [low, high] ranges, starting a new range whenever
+    two consecutive tweets are more than max_gap (a timedelta) apart.
+    """
+    ranges = []
+    previous_time = None
+    for tweet_id in sorted(map(int, tweet_ids)):
+        time = datetime_from_tweet_id(tweet_id)
+        if ranges and time - previous_time <= max_gap:
+            ranges[-1][1] = tweet_id
+        else:
+            ranges.append([tweet_id, tweet_id])
+        previous_time = time
+    return ranges
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent [low, high] ranges.
+    """
+    merged = []
+    for low, high in sorted(map(list, ranges)):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def subtract_range(ranges, low, high):
+    """Remove the [low, high] range from a list of ranges.
+    """
+    result = []
+    for range_low, range_high in ranges:
+        if range_high < low or range_low > high:
+            result.append([range_low, range_high])
+            continue
+        if range_low < low:
+            result.append([range_low, low - 1])
+        if range_high > high:
+            result.append([high + 1, range_high])
+    return result
+
+
+def find_gaps(ranges):
+    """Return the gaps between sorted, merged ranges as (since_id, max_id)
+    tuples, both exclusive, ready to be used for twitter queries.
+    """
+    return [(previous[1], following[0])
+            for previous, following in zip(ranges, ranges[1:])]
+
+
+class GapIndex(object):
+    """The persisted index of covered tweet ID ranges of one brand.
+
+    All methods are thread-safe so that multiple backfill workers can report
+    their progress into the same index.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = RLock()
+        if self.path.exists():
+            data = json.loads(self.path.bytes())
+        else:
+            data = {}
+        self.covered = data.get('covered', [])
+        self.reopened = data.get('reopened', [])
+        self.checkpoints = data.get('checkpoints', {})
+
+    @classmethod
+    def for_brand(cls, brand):
+        return cls(Path(__file__).joinpath(
+            '..', '..', 'gap_index_' + brand + '.json').abspath())
+
+    def save(self):
+        """Write the index to a temporary file and atomically rename it, so
+        that a crash never leaves a truncated index behind.
+        """
+        with self.lock:
+            atomic_write_json(self.path, {'covered': self.covered,
+                                          'reopened': self.reopened,
+                                          'checkpoints': self.checkpoints})
+
+    def refresh(self, tweet_ids, max_gap):
+        """Merge the ranges found in the database into the covered ranges,
+        leaving out the ranges which were reopened.
+        """
+        with self.lock:
+            ranges = ranges_from_ids(tweet_ids, max_gap) + self.covered
+            for low, high in self.reopened:
+                ranges = subtract_range(ranges, low, high)
+            self.covered = merge_ranges(ranges)
+            # Drop the checkpoints of gaps which no longer exist in that form;
+            # the tweets imported so far are part of the covered ranges now.
+            gap_keys = {'{}-{}'.format(*gap) for gap in self.gaps()}
+            self.checkpoints = {key: value
+                                for key, value in self.checkpoints.items()
+                                if key in gap_keys}
+            self.save()
+
+    def reopen(self, low, high):
+        """Mark the [low, high] range as incomplete so that it is imported
+        again.
+        """
+        with self.lock:
+            self.reopened = merge_ranges(self.reopened + [[low, high]])
+            self.covered = subtract_range(self.covered, low, high)
+            self.save()
+
+    def expire_reopened(self, tweet_id):
+        """Drop the parts of the reopened ranges older than tweet_id, e.g.
+        because they can not be imported anymore.
+        """
+        with self.lock:
+            self.reopened = subtract_range(self.reopened, 0, tweet_id - 1)
+            self.save()
+
+    def gaps(self):
+        with self.lock:
+            return find_gaps(self.covered)
+
+    def checkpoint(self, gap):
+        """Return the oldest tweet ID imported so far for this gap or None.
+        """
+        with self.lock:
+            return self.checkpoints.get('{}-{}'.format(*gap))
+
+    def set_checkpoint(self, gap, tweet_id):
+        with self.lock:
+            self.checkpoints['{}-{}'.format(*gap)] = int(tweet_id)
+            self.save()
+
+    def close_gap(self, gap, since_id=None):
+        """Mark the gap as covered from since_id (default: the older end of
+        the gap) to its newer end and drop its checkpoint.
+        """
+        if since_id is None:
+            since_id = gap[0]
+        max_id = gap[1]
+        with self.lock:
+            self.checkpoints.pop('{}-{}'.format(*gap), None)
+            self.reopened = subtract_range(self.reopened, since_id, max_id)
+            self.covered = merge_ranges(self.covered + [[since_id, max_id]])
+            self.save()
@@ -0,0 +1,153 @@
+"""
+Crash-safe checkpoint journal for import sessions.
+
+The state of a session is stored in two files:
+- "<name>.json": a snapshot of the complete session state,
+- "<name>.journal": progress records appended since the last snapshot, one
+  JSON object per line.
+
+Progress records are collected in memory with append() and written to the
+journal in groups with commit(), which is meant to be called after the
+corresponding database batch was flushed. This way a checkpoint is never ahead
+of the database and we only touch the disk once per batch.
+
+Every few commits the journal is compacted: the state is written to a
+temporary file, fsynced and atomically renamed to the snapshot, then the
+journal is truncated. Because the records replace values instead of changing
+them, replaying a journal on top of a newer snapshot of the same session is
+harmless.
+
+Records of an old session must never be replayed onto a new one, therefore
+the journal is always removed (remove()) or truncated (start()) before the
+snapshot is removed or replaced.
+
+On startup the snapshot is loaded and the journal is replayed up to the last
+complete record; a torn record at the end (crash while writing) is dropped.
+"""
+
+from path import Path
+import json
+import os
+
+
+def atomic_write(path, write):
+    """Call write with a binary file object of a temporary file, then fsync
+    and atomically rename it to path, so that a crash never leaves a truncated
+    file behind.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fio:
+        write(fio)
+        fio.flush()
+        os.fsync(fio.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data):
+    """Atomically write data as JSON to path.
+    """
+    atomic_write(path, lambda fio: fio.write(json.dumps(data).encode('utf-8')))
+
+
+class CheckpointJournal(object):
+    """Session state backed by a snapshot file and an append-only journal.
+    """
+
+    def __init__(self, path, commits_per_compaction=50):
+        path = Path(path)
+        self.snapshot_path = path + '.json'
+        self.journal_path = path + '.journal'
+        self.commits_per_compaction = commits_per_compaction
+        self.pending = []
+        self.num_commits = 0
+        self.state = self._recover()
+
+    def _recover(self):
+        """Load the snapshot and replay all complete journal records.
+        Return None when there is no session.
+        """
+        state = None
+        if self.snapshot_path.exists():
+            try:
+                state = json.loads(self.snapshot_path.bytes())
+            except ValueError:
+                # A snapshot written before we wrote them atomically may be
+                # truncated; the journal still has the latest records.
+                print('Ignoring corrupt snapshot {}.'.format(
+                    self.snapshot_path))
+
+        if not self.journal_path.exists():
+            return state
+
+        consistent_size = 0
+        with open(self.journal_path, 'rb') as fio:
+            for line in fio:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                state = dict(state or {}, **record)
+                consistent_size += len(line)
+
+        if consistent_size < self.journal_path.size:
+            # Drop the torn record so that new records are appended to a
+            # consistent journal.
+            with open(self.journal_path, 'r+b') as fio:
+                fio.truncate(consistent_size)
+                os.fsync(fio.fileno())
+        return state
+
+    def start(self, state):
+        """Start a new session with the given state.
+        """
+        self.state = dict(state)
+        self.pending = []
+        # Truncate the journal first, so that a crash before the new snapshot
+        # is written never replays old records onto the new session.
+        self._truncate_journal()
+        atomic_write_json(self.snapshot_path, self.state)
+
+    def append(self, record):
+        """Apply a progress record to the state; it is persisted with the next
+        commit().
+        """
+        self.state.update(record)
+        self.pending.append(record)
+
+    def commit(self):
+        """Write all pending records to the journal with a single fsync.
+        """
+        if not self.pending:
+            return
+        with open(self.journal_path, 'a') as fio:
+            fio.write(''.join(json.dumps(record) + '\n'
+                              for record in self.pending))
+            fio.flush()
+            os.fsync(fio.fileno())
+        self.pending = []
+        self.num_commits += 1
+        if self.num_commits % self.commits_per_compaction == 0:
+            self.compact()
+
+    def compact(self):
+        """Store the state as new snapshot and truncate the journal.
+        """
+        atomic_write_json(self.snapshot_path, self.state)
+        self._truncate_journal()
+
+    def _truncate_journal(self):
+        with open(self.journal_path, 'w') as fio:
+            fio.flush()
+            os.fsync(fio.fileno())
+
+    def remove(self):
+        """Terminate the session by removing its files.
+        """
+        # Remove the journal first, so that a crash in between never leaves
+        # its records behind for the next session.
+        self.journal_path.remove_p()
+        self.snapshot_path.remove_p()
+        self.state = None
+        self.pending = []
@@ -0,0 +1,49 @@
+"""
+Load the sentiment and stock data of a brand per minute, hour or day.
+
+The data is read from the rollup pyramid of the brand (see rollup.py), which is
+brought up to date with the tweets and stock bars added since the last run, so
+the tweets are only fetched and parsed once.
+"""
+
+import pandas as pd
+import rollup
+
+
+def load(brand, resolution='hour', stale=False):
+    """Return a data frame with the sentiment ("count", "mean" and "std") and
+    a series with the closing stock price per bucket of the resolution.
+    With stale the stored pyramid is used without fetching new changes.
+    """
+    pyramid = rollup.Pyramid(brand)
+    if not (stale and pyramid.path.exists()):
+        pyramid.update()
+    return pyramid.rollups[resolution].to_frames()
+
+
+def plot_data(sentiment, stock):
+    """Build the sorted axis for plotting the amount of tweets, the sentiment
+    and the stock price per bucket. Buckets without stock price use the
+    previous price.
+    """
+    return {'time': list(sentiment.index.to_pydatetime()),
+            'tweets': list(sentiment['count'].astype(int)),
+            'sentiment': list(sentiment['mean']),
+            'stock': list(stock.reindex(sentiment.index).ffill())}
+
+
+def correlation_series(sentiment, stock):
+    """Return the sentiment series and the (not yet interpolated) stock
+    series for the time range where we have both, stock and tweets.
+    """
+    # Use timestamp as x-axis by using them as indexes for the panda series.
+    timestamps = list(sentiment.index)
+    # Focus on the time range where we have both, stock and tweets, while
+    # still supporting gaps in stocks.
+    timestamps_with_tweets_and_stock = sorted(set(sentiment.index)
+                                              & set(stock.index))
+    timestamps = timestamps[
+        timestamps.index(timestamps_with_tweets_and_stock[0]):
+        timestamps.index(timestamps_with_tweets_and_stock[-1])]
+    index = pd.DatetimeIndex(timestamps)
+    return sentiment['mean'].reindex(index), stock.reindex(index)
@@ -0,0 +1,196 @@
+"""
+Pre-aggregated sentiment and stock data per minute, hour and day.
+
+For each brand we maintain a pyramid of rollups, one per resolution in
+utils.RESOLUTIONS. Each bucket of a rollup contains the count, sum and sum of
+squares of the tweet sentiments and the closing stock price (the price of the
+latest stock bar within the bucket).
+
+The sentiment rollups are built from the rows of the "vader_sentiment/with"
+view, which only contain the creation time and the sentiment of each tweet.
+Afterwards they are updated incrementally: we read the "_changes" feed of the
+twitter database since the last update, filtered by the same view so that
+only scored tweets are transferred, and add them to all resolutions. The
+sentiment and stock parts are updated separately, so the stock import (2c)
+does not depend on the twitter database.
+
+The stock rollups are updated from the "_changes" feed of the stock database.
+Stock bars which are imported again (2c) replace the close of their bucket
+with the same value.
+
+Sentiments are only added, never replaced: a scored tweet which is saved
+again (e.g. rescored) or deleted would make the rollups wrong. Therefore we
+compare the amount of rolled up tweets with the amount of rows in the
+"vader_sentiment/with" view after each update and rebuild the sentiment
+rollups from the view rows when they differ.
+
+The pyramid is stored in "cache/rollup_<brand>.npz" together with the last
+sequences of both changes feeds.
+"""
+
+from aggregation import BucketStats
+from datetime import datetime
+from journal import atomic_write
+from path import Path
+from tqdm import tqdm
+import couchdb
+import json
+import numpy as np
+import pandas as pd
+import utils
+
+
+CACHE_DIRECTORY = Path(__file__).joinpath('..', '..', 'cache').abspath()
+
+# Amount of changes fetched with one request.
+CHANGES_PER_BATCH = 10000
+
+# Amount of view rows fetched with one request.
+ROWS_PER_BATCH = 10000
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class Rollup(BucketStats):
+    """Running sentiment statistics (see BucketStats) and the closing stock
+    price per bucket of one resolution.
+    """
+
+    COLUMNS = BucketStats.COLUMNS + ('close', 'close_time')
+
+    def _empty(self, size):
+        values = super(Rollup, self)._empty(size)
+        values[:, 3:] = np.nan
+        return values
+
+    def add_stock(self, bucket, time, price):
+        row = self.values[self._slot(bucket)]
+        time = (time - EPOCH).total_seconds()
+        if not row[4] > time:
+            row[3] = price
+            row[4] = time
+
+    def to_frames(self):
+        """Return a data frame with the sentiment columns "count", "mean" and
+        "std" and a series with the closing stock prices, both indexed by
+        bucket.
+        """
+        index, values = self._sorted_values()
+        has_stock = ~np.isnan(values[:, 3])
+        stock = pd.Series(values[has_stock, 3], index=index[has_stock])
+        return self.to_frame(), stock
+
+
+class Pyramid(object):
+    """The rollups of all resolutions of one brand.
+    """
+
+    def __init__(self, brand):
+        self.brand = brand
+        self.path = CACHE_DIRECTORY.joinpath('rollup_' + brand + '.npz')
+        # A twitter sequence of None means that the sentiment rollups were
+        # not built yet.
+        self.seqs = {'twitter': None, 'stock': 0}
+        self.rollups = {resolution: Rollup()
+                        for resolution in utils.RESOLUTIONS}
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self.seqs = json.loads(str(data['seqs']))
+                for resolution in utils.RESOLUTIONS:
+                    self.rollups[resolution] = Rollup(
+                        data[resolution + '_buckets'].tolist(),
+                        data[resolution + '_values'])
+
+    def save(self):
+        """Write the pyramid to a temporary file and atomically rename it.
+        """
+        CACHE_DIRECTORY.makedirs_p()
+        arrays = {'seqs': json.dumps(self.seqs)}
+        for resolution, rollup in self.rollups.items():
+            arrays[resolution + '_buckets'] = np.array(
+                rollup.buckets(), dtype='datetime64[s]')
+            arrays[resolution + '_values'] = rollup.values[:len(rollup.slots)]
+        atomic_write(self.path, lambda fio: np.savez(fio, **arrays))
+
+    def _changes(self, database, name, description, **options):
+        """Iterate over the documents changed since the last update and
+        remember the sequence of the last change.
+        """
+        with tqdm(desc=description) as bar:
+            while True:
+                changes = database.changes(since=self.seqs[name],
+                                           include_docs=True,
+                                           limit=CHANGES_PER_BATCH,
+                                           **options)
+                for change in changes['results']:
+                    if not change.get('deleted'):
+                        yield change['doc']
+                bar.update(len(changes['results']))
+                self.seqs[name] = changes['last_seq']
+                if not changes['results']:
+                    return
+
+    def update(self):
+        """Add the new scored tweets and stock bars to all rollups.
+        """
+        self.update_sentiment()
+        self.update_stock()
+
+    def update_sentiment(self):
+        """Add the tweets scored since the last update to all rollups and
+        rebuild the sentiment rollups when they do not match the view.
+        """
+        twitter_database = couchdb.Server()['mt-twitter-' + self.brand]
+        if self.seqs['twitter'] is None:
+            self._build_sentiment(twitter_database)
+        else:
+            for doc in self._changes(twitter_database, 'twitter',
+                                     'Rolling up tweets..', filter='_view',
+                                     view='vader_sentiment/with'):
+                time = utils.utc_from_string(doc['created_at'])
+                for resolution, rollup in self.rollups.items():
+                    rollup.add(utils.truncate(time, resolution),
+                               doc['vader_sentiment'])
+
+            num_scored_tweets = twitter_database.view('vader_sentiment/with',
+                                                      limit=0).total_rows
+            if self._num_tweets() != num_scored_tweets:
+                print('Rolled up {} of {} scored tweets, rebuilding.'.format(
+                    self._num_tweets(), num_scored_tweets))
+                self._build_sentiment(twitter_database)
+        self.save()
+
+    def update_stock(self):
+        """Add the stock bars imported since the last update to all rollups.
+        """
+        stock_database = couchdb.Server()['mt-stock-' + self.brand]
+        for doc in self._changes(stock_database, 'stock',
+                                 'Rolling up stock data..'):
+            if 'price' not in doc:
+                continue
+            time = utils.utc_from_string(doc['time'])
+            for resolution, rollup in self.rollups.items():
+                rollup.add_stock(utils.truncate(time, resolution), time,
+                                 float(doc['price']))
+        self.save()
+
+    def _build_sentiment(self, twitter_database):
+        """Aggregate the sentiment rollups from scratch from the rows of the
+        "vader_sentiment/with" view, which only contain the creation time and
+        the sentiment of each tweet.
+        """
+        for rollup in self.rollups.values():
+            rollup.values[:, :3] = 0
+        # Tweets scored while we read the view are also in the changes feed
+        # after this sequence; the next update then detects the mismatch.
+        self.seqs['twitter'] = twitter_database.info()['update_seq']
+        rows = twitter_database.iterview('vader_sentiment/with',
+                                         ROWS_PER_BATCH)
+        for row in tqdm(rows, 'Rolling up tweets..'):
+            time = utils.utc_from_string(row.key)
+            for resolution, rollup in self.rollups.items():
+                rollup.add(utils.truncate(time, resolution), row.value)
+
+    def _num_tweets(self):
+        minutes = self.rollups['minute']
+        return int(minutes.values[:len(minutes.slots), 0].sum())
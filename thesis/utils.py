@@ -5,24 +5,29 @@ import pytz
 import sys
 
 
-def hour_from_string(date_str):
-    """Parse string with date and time and return a datetime object
-    rounded to the hour.
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+
+def utc_from_string(date_str):
+    """Parse string with date and time and return a naive datetime object
+    in UTC.
     """
     date = dateutil.parser.parse(date_str)
     if date.tzinfo:
         date = pytz.utc.normalize(date).replace(tzinfo=None)
-    return date.replace(microsecond=0, second=0, minute=0)
+    return date
 
 
-def day_from_string(date_str):
-    """Parse string with date and time and return a datetime object
-    rounded to the day.
+def truncate(date, resolution):
+    """Round a datetime object down to the resolution ("minute", "hour" or
+    "day").
     """
-    date = dateutil.parser.parse(date_str)
-    if date.tzinfo:
-        date = pytz.utc.normalize(date).replace(tzinfo=None)
-    return date.replace(microsecond=0, second=0, minute=0, hour=0)
+    date = date.replace(microsecond=0, second=0)
+    if resolution in ('hour', 'day'):
+        date = date.replace(minute=0)
+    if resolution == 'day':
+        date = date.replace(hour=0)
+    return date
 
 
 def granger(series_a, series_b, output_fio, maxlag):
@@ -0,0 +1,85 @@
+"""
+Build the CouchDB view indexes in the background.
+
+CouchDB builds view indexes lazily: the first query after a big import blocks
+until all new documents are indexed. The rollup update (see rollup.py) reads
+the "vader_sentiment/with" view to verify the rolled up tweets, and 3a reads
+"vader_sentiment/without" for the tweets to score. In order not to block
+these reads, the import scripts trigger the index build after each batch
+without waiting for it, and warm_up() builds the indexes while displaying
+the progress reported by CouchDB in "_active_tasks".
+"""
+
+from threading import Thread
+from time import sleep
+from tqdm import tqdm
+
+
+VIEWS = ('vader_sentiment/with', 'vader_sentiment/without')
+
+# Return the current index immediately and update it afterwards.
+# "stale" is understood by all CouchDB versions, "update" by CouchDB >= 2.1.
+STALE_OPTIONS = {'stale': 'update_after', 'update': 'lazy'}
+
+
+def trigger_index_build(database, views=VIEWS):
+    """Make CouchDB update the view indexes without waiting for it.
+    """
+    for name in views:
+        # View results are lazy; len() actually sends the request.
+        len(database.view(name, limit=0, **STALE_OPTIONS))
+
+
+def task_database_name(task):
+    """Return the database name of an active task.
+    CouchDB 2 reports shard paths such as
+    "shards/00000000-1fffffff/mt-twitter-tesla.1525000000" instead of the name.
+    """
+    database = task.get('database', '')
+    if database.startswith('shards/'):
+        return database.split('/')[-1].rsplit('.', 1)[0]
+    return database
+
+
+def indexer_progress(server, database_name):
+    """Return the progress (0-100) of the running indexer tasks of a database
+    or None when there are no indexer tasks.
+    """
+    tasks = [task for task in server.tasks()
+             if task.get('type') == 'indexer'
+             and task_database_name(task) == database_name]
+    if not tasks:
+        return None
+    # CouchDB 2 runs one task per shard and view group, so we use the mean.
+    return sum(task.get('progress', 0) for task in tasks) / len(tasks)
+
+
+def warm_up(server, database, views=VIEWS, poll_interval=1):
+    """Build the view indexes of a database and display the progress until
+    they are up to date.
+    Errors of the view requests are raised once all builds have stopped.
+    """
+    errors = []
+
+    def build(name):
+        try:
+            len(database.view(name, limit=0))
+        except Exception as exc:
+            errors.append(exc)
+
+    builders = [Thread(target=build, args=(name,)) for name in views]
+    for builder in builders:
+        builder.daemon = True
+        builder.start()
+
+    with tqdm(total=100, desc='Indexing views of ' + database.name) as bar:
+        while any(builder.is_alive() for builder in builders):
+            progress = indexer_progress(server, database.name)
+            if progress is not None:
+                bar.update(max(int(progress) - bar.n, 0))
+            sleep(poll_interval)
+        if not errors:
+            bar.update(100 - bar.n)
+
+    if errors:
+        raise errors[0]